@@ -20,228 +20,703 @@ Special thanks to David Barrett for the inspiration on this https://github.com/D
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkcalendar import DateEntry
-import requests
 from datetime import datetime, timedelta
 import threading
 import os
-import subprocess
+import re
 import sys
-
-def get_message_trace_report():
-    def background_task():
+import shutil
+import hashlib
+import time
+import importlib.util
+import html
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+# orjson parses and writes JSON faster; fall back to the standard library if it is not installed
+try:
+    import orjson
+except ImportError:
+    from json import dumps as _json_dumps, loads as _json_loads
+else:
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode("utf-8")
+
+# Shared HTTP session so repeat calls to the same host reuse pooled keep-alive connections.
+# Created on first use so requests/urllib3 are not imported before the window is drawn.
+_HTTP = None
+_HTTP_LOCK = threading.Lock()
+
+def _http_session():
+    global _HTTP
+    with _HTTP_LOCK:
+        if _HTTP is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=10,
+                # read=False: a read timeout is raised as-is instead of being retried, so each call waits at most
+                # one read timeout for a response and the caller sees requests' ReadTimeout.
+                # raise_on_status=False hands the last 429/5xx response back so its error body reaches the user, and
+                # Retry-After is ignored because urllib3 would otherwise sleep for whatever the server asks, unbounded.
+                max_retries=Retry(
+                    total=3,
+                    read=False,
+                    backoff_factor=0.3,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    raise_on_status=False,
+                    respect_retry_after_header=False,
+                ),
+            ))
+            _HTTP = session
+        return _HTTP
+
+# (connect, read) timeouts in seconds, so a stalled connection cannot hang the worker thread.
+# The read timeout bounds each wait for data, not the whole download.
+_AUTH_TIMEOUT = (5, 30)
+_REPORT_TIMEOUT = (5, 120)
+
+def _is_timeout(error):
+    # Read timeouts can reach the worker as requests' Timeout, as a bare urllib3 ReadTimeoutError, or as a
+    # ConnectionError wrapping one (through MaxRetryError.reason), depending on where the read stalled
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
+
+    if isinstance(error, (requests.exceptions.Timeout, ReadTimeoutError)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        inner = error.args[0] if error.args else None
+        return isinstance(getattr(inner, "reason", None), ReadTimeoutError) or isinstance(error.__context__, ReadTimeoutError)
+    return False
+
+def _error_message(error):
+    # Text shown to the user for an exception raised while fetching or saving a report
+    import requests
+
+    if _is_timeout(error):
+        return f"The request timed out, please try again: {error}"
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Request error: {error}"
+    return f"An unexpected error occurred: {error}"
+
+# OAuth token cache: (tenant_id, app_id, scope, sha256(app_secret)) -> (access_token, expiry_epoch)
+_TOKEN_SCOPE = "https://outlook.office365.com/.default"
+_TOKEN_CACHE = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+# Tokens are also persisted in the OS credential store (Windows Credential Manager) via the optional
+# keyring package, so relaunching the app within the token lifetime skips the auth round-trip
+_KEYRING_SERVICE = "ReportingWebServices"
+# Credential Manager caps a credential at 2560 bytes and keyring stores it as UTF-16, so an access token
+# (usually longer than 1280 characters on its own) is split across "{tenant}:{app}:{n}" entries.
+# The "{tenant}:{app}" entry holds the expiry, the secret hash and the number of parts.
+_KEYRING_CHUNK = 1000
+
+def _load_persisted_token(tenant_id, app_id, secret_hash):
+    # Returns (access_token, expiry_epoch) saved by an earlier run for the same credentials, or None
+    user = f"{tenant_id}:{app_id}"
+    try:
+        import keyring
+        stored = keyring.get_password(_KEYRING_SERVICE, user)
+        if not stored:
+            return None
+        header = _json_loads(stored)
+        # Only hand the token back to the same secret that obtained it
+        if header.get("secret") != secret_hash:
+            return None
+        parts = [keyring.get_password(_KEYRING_SERVICE, f"{user}:{index}") for index in range(int(header["parts"]))]
+        if not parts or None in parts:
+            return None
+        return "".join(parts), float(header["expiry"])
+    except Exception:
+        # keyring missing, no usable backend, or an entry written by an older version
+        return None
+
+def _save_persisted_token(tenant_id, app_id, secret_hash, token, expiry):
+    try:
+        import keyring
+    except ImportError:
+        return
+
+    user = f"{tenant_id}:{app_id}"
+    parts = [token[start:start + _KEYRING_CHUNK] for start in range(0, len(token), _KEYRING_CHUNK)]
+    try:
+        # Parts left over from an earlier, longer token would otherwise keep fragments of a valid token around
         try:
-            # Gather user inputs
-            app_id = app_id_entry.get().strip()
-            tenant_id = tenant_id_entry.get().strip()
-            app_secret = app_secret_entry.get().strip()
-            start_date = start_date_entry.get_date().strftime('%Y-%m-%d')
-            end_date = end_date_entry.get_date().strftime('%Y-%m-%d')
-            save_path = save_path_var.get()
-
-            # Report type selection
-            report_type = report_type_combobox.get()
-
-            if not app_id or not tenant_id or not app_secret:
-                messagebox.showerror("Error", "App ID, Tenant ID, and App Secret are required!")
-                return
-
-            if not start_date or not end_date:
-                messagebox.showerror("Error", "Start Date and End Date are required!")
-                return
+            old_parts = int(_json_loads(keyring.get_password(_KEYRING_SERVICE, user) or "{}").get("parts", 0))
+        except (ValueError, TypeError, AttributeError):
+            old_parts = 0
 
-            if not save_path:
-                messagebox.showerror("Error", "Please select a folder to save the report!")
-                return
-
-            # Validate if Message Trace Detail is selected and required fields are filled
-            if report_type == "Message Trace Detail":
-                sender_address = sender_address_entry.get().strip()
-                recipient_address = recipient_address_entry.get().strip()
-                message_trace_id = message_trace_id_entry.get().strip()
-
-                if not sender_address or not recipient_address or not message_trace_id:
-                    messagebox.showerror("Error", "Sender Address, Recipient Address, and Message Trace ID are mandatory for Message Trace Detail!")
-                    return
-
-            # Check if the directory exists, if not create it
-            if not os.path.exists(save_path):
-                os.makedirs(save_path)
-
-            # Update the processing label
-            processing_label.config(text="Processing... Please wait.")
-            root.update()
-
-            # Token acquisition
-            auth_url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
-            token_data = {
-                "grant_type": "client_credentials",
-                "client_id": app_id,
-                "client_secret": app_secret,
-                "scope": "https://outlook.office365.com/.default",
-            }
-            response = requests.post(auth_url, data=token_data)
-            response.raise_for_status()
-            token = response.json().get("access_token")
-
-            if not token:
-                messagebox.showerror("Error", "Failed to retrieve OAuth token!")
+        # Drop the old header first and write the new one last, so a half-finished save is never read back
+        try:
+            keyring.delete_password(_KEYRING_SERVICE, user)
+        except keyring.errors.PasswordDeleteError:
+            pass
+        for index in range(len(parts), old_parts):
+            try:
+                keyring.delete_password(_KEYRING_SERVICE, f"{user}:{index}")
+            except keyring.errors.PasswordDeleteError:
+                pass
+        for index, part in enumerate(parts):
+            keyring.set_password(_KEYRING_SERVICE, f"{user}:{index}", part)
+        keyring.set_password(
+            _KEYRING_SERVICE,
+            user,
+            _json_dumps({"expiry": expiry, "secret": secret_hash, "parts": len(parts)}),
+        )
+    except Exception as e:
+        # The in-memory cache still covers this session
+        print(f"Error saving OAuth token to the credential store: {e}")
+
+def _get_token(tenant_id, app_id, app_secret):
+    # The secret is hashed so plaintext credentials never sit in the cache keys
+    secret_hash = hashlib.sha256(app_secret.encode("utf-8")).hexdigest()
+    key = (tenant_id, app_id, _TOKEN_SCOPE, secret_hash)
+    with _TOKEN_CACHE_LOCK:
+        cached = _TOKEN_CACHE.get(key)
+    if not cached:
+        cached = _load_persisted_token(tenant_id, app_id, secret_hash)
+        if cached:
+            with _TOKEN_CACHE_LOCK:
+                _TOKEN_CACHE[key] = cached
+    # Reuse the cached token until it is within 60 seconds of expiring
+    if cached and cached[1] - time.time() > 60:
+        return cached[0]
+
+    auth_url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+    token_data = {
+        "grant_type": "client_credentials",
+        "client_id": app_id,
+        "client_secret": app_secret,
+        "scope": _TOKEN_SCOPE,
+    }
+    response = _http_session().post(auth_url, data=token_data, timeout=_AUTH_TIMEOUT)
+    response.raise_for_status()
+    payload = _json_loads(response.content)
+    token = payload.get("access_token")
+    if token:
+        expiry = time.time() + int(payload.get("expires_in", 0))
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE[key] = (token, expiry)
+        _save_persisted_token(tenant_id, app_id, secret_hash, token, expiry)
+    return token
+
+_ATOM_NS = "http://www.w3.org/2005/Atom"
+_ATOM_ENTRY = f"{{{_ATOM_NS}}}entry"
+_ATOM_LINK = f"{{{_ATOM_NS}}}link"
+_METADATA_NS = "http://schemas.microsoft.com/ado/2007/08/dataservices/metadata"
+_DATA_NS = "http://schemas.microsoft.com/ado/2007/08/dataservices"
+
+def _download_page(url, headers, path):
+    # Streams one report page to disk; returns the error body on a non-200 response
+    with _http_session().get(url, headers=headers, stream=True, timeout=_REPORT_TIMEOUT) as response:
+        if response.status_code != 200:
+            return response.text
+        # Copy through a 64 KiB buffer instead of holding the whole XML in memory.
+        # decode_content makes urllib3 undo any gzip/deflate transfer encoding while copying.
+        response.raw.decode_content = True
+        _copy_body(response, path)
+    return None
+
+def _copy_body(response, path):
+    # Reading response.raw bypasses requests' exception mapping, so urllib3 errors raised mid-body are
+    # translated here; a truncated file is removed rather than left behind as a partial report
+    import requests
+    from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+
+    try:
+        try:
+            with open(path, "wb") as file:
+                shutil.copyfileobj(response.raw, file, length=1 << 16)
+        except ReadTimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e, response=response) from e
+        except SSLError as e:
+            raise requests.exceptions.SSLError(e, response=response) from e
+        except ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e, response=response) from e
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e, response=response) from e
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+def _release(elem):
+    # Frees a parsed element and its already-processed siblings so streaming parses stay O(1) in memory
+    elem.clear()
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+def _xml():
+    # lxml when installed; otherwise the standard library's ElementTree, which is slower but always there
+    try:
+        from lxml import etree
+    except ImportError:
+        import xml.etree.ElementTree as etree
+
+        # Keep the usual prefixes when entries are copied between pages
+        etree.register_namespace("", _ATOM_NS)
+        etree.register_namespace("m", _METADATA_NS)
+        etree.register_namespace("d", _DATA_NS)
+    return etree
+
+def _iterparse(path, tags):
+    # Yields elements whose tag is in tags as they finish parsing, freeing each one once the caller is done
+    etree = _xml()
+    if hasattr(etree, "LXML_VERSION"):
+        for _, elem in etree.iterparse(path, events=("end",), tag=tags):
+            yield elem
+            _release(elem)
+        return
+
+    # ElementTree has no tag filter or parent pointers, so track the root and detach finished children
+    root = None
+    for event, elem in etree.iterparse(path, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event == "end" and elem.tag in tags:
+            yield elem
+            elem.clear()
+            if elem in root:
+                root.remove(elem)
+
+def _iter_entries(path):
+    # Streams the feed's <entry> elements without building the whole document tree
+    return _iterparse(path, (_ATOM_ENTRY,))
+
+def _next_link(path):
+    # Returns the href of the feed's <link rel="next">, if the server paged the result
+    next_url = None
+    for elem in _iterparse(path, (_ATOM_LINK, _ATOM_ENTRY)):
+        if elem.tag == _ATOM_LINK and elem.get("rel") == "next":
+            next_url = elem.get("href")
+    return next_url
+
+def _append_entries(path, out):
+    etree = _xml()
+    for entry in _iter_entries(path):
+        out.write(etree.tostring(entry, encoding="utf-8"))
+
+# Feed-level elements such as the next link follow the last entry, so only the end of page 1 needs editing
+_FEED_TAIL_SCAN = 1 << 16
+_NEXT_LINK_RE = re.compile(rb"""<link\b[^>]*\brel\s*=\s*["']next["'][^>]*(?:/>|>\s*</link>)""")
+_HREF_RE = re.compile(rb"""\bhref\s*=\s*(["'])(.*?)\1""")
+# Guard against a server that never stops handing out next links
+_MAX_PAGES = 1000
+
+def _tail_next_link(path):
+    # Finds the first page's next link without parsing the whole document, which matters for large
+    # single-page reports; relies on the same tail layout as _start_merged_feed
+    size = os.path.getsize(path)
+    with open(path, "rb") as page:
+        page.seek(max(0, size - _FEED_TAIL_SCAN))
+        tail = page.read()
+    last_entry = tail.rfind(b"</entry>")
+    link = _NEXT_LINK_RE.search(tail, last_entry + len(b"</entry>") if last_entry != -1 else 0)
+    href = _HREF_RE.search(link.group(0)) if link else None
+    return html.unescape(href.group(2).decode("utf-8")) if href else None
+
+def _start_merged_feed(first_page, out):
+    # Copies the first page into the merged feed without its closing </feed> and without its next link,
+    # which would otherwise point at data that is already in the file
+    size = os.path.getsize(first_page)
+    with open(first_page, "rb") as page:
+        tail_start = max(0, size - _FEED_TAIL_SCAN)
+        page.seek(tail_start)
+        tail = page.read()
+        feed_end = tail.rfind(b"</feed>")
+        if feed_end == -1:
+            raise ValueError("The first report page is not a complete Atom feed (no closing </feed> found)")
+        last_entry = tail.rfind(b"</entry>", 0, feed_end)
+        cut = last_entry + len(b"</entry>") if last_entry != -1 else 0
+
+        page.seek(0)
+        remaining = tail_start + cut
+        while remaining:
+            chunk = page.read(min(remaining, 1 << 16))
+            out.write(chunk)
+            remaining -= len(chunk)
+        out.write(_NEXT_LINK_RE.sub(b"", tail[cut:feed_end]))
+
+def _merge_next_pages(output_path, headers):
+    # Follows the feed's next links and appends their entries to the first page's feed.
+    # Next links are only known once a page has arrived, so pages are fetched one after another,
+    # but the next page downloads while the current one is being appended.
+    # The merged feed is built in a temporary file and only replaces the report once every page is in;
+    # if any page fails, no partial report is left on disk.
+    merged_path = f"{output_path}.merging"
+    page_paths = (f"{output_path}.page0", f"{output_path}.page1")
+    pages = 1
+    try:
+        next_url = _tail_next_link(output_path)
+        if not next_url:
+            return pages
+        seen_urls = {next_url}
+
+        with open(merged_path, "wb") as out, ThreadPoolExecutor(max_workers=1) as pool:
+            _start_merged_feed(output_path, out)
+
+            future = pool.submit(_download_page, next_url, headers, page_paths[pages % 2])
+            while future is not None:
+                error = future.result()
+                if error is not None:
+                    import requests
+                    raise requests.exceptions.HTTPError(f"API call failed on page {pages + 1}: {error}")
+                page_path = page_paths[pages % 2]
+                pages += 1
+                next_url = _next_link(page_path)
+                if next_url in seen_urls:
+                    raise RuntimeError(f"The service returned the same next link twice after page {pages}; stopped to avoid a paging loop")
+                if next_url and pages >= _MAX_PAGES:
+                    raise RuntimeError(f"The report has more than {_MAX_PAGES} pages; narrow the date range and try again")
+                if next_url:
+                    seen_urls.add(next_url)
+                future = pool.submit(_download_page, next_url, headers, page_paths[pages % 2]) if next_url else None
+                _append_entries(page_path, out)
+
+            out.write(b"</feed>")
+        os.replace(merged_path, output_path)
+    except BaseException:
+        for path in (merged_path, output_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        for page_path in page_paths:
+            if os.path.exists(page_path):
+                os.remove(page_path)
+    return pages
+
+_ENTRY_PROPERTIES = f"{{{_ATOM_NS}}}content/{{{_METADATA_NS}}}properties"
+_PARQUET_BATCH_SIZE = 10000
+
+def _entry_rows(xml_path):
+    # Yields each entry's <m:properties> as a {name: text} dict
+    for entry in _iter_entries(xml_path):
+        properties = entry.find(_ENTRY_PROPERTIES)
+        if properties is not None:
+            yield {child.tag.rpartition("}")[2]: child.text for child in properties}
+
+def _convert_to_parquet(xml_path):
+    # Streams each entry's <m:properties> into a zstd-compressed Parquet file next to the XML report.
+    # Returns the Parquet path, or None if the report had no entries.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Properties can first appear in any entry, so collect the full column set in a cheap first pass;
+    # fixing the schema from the first batch would silently drop later columns.
+    # Every value is kept as the string the service returned.
+    columns = {}
+    for row in _entry_rows(xml_path):
+        columns.update(dict.fromkeys(row))
+    if not columns:
+        return None
+    schema = pa.schema([(name, pa.string()) for name in columns])
+
+    parquet_path = os.path.splitext(xml_path)[0] + ".parquet"
+    try:
+        with pq.ParquetWriter(parquet_path, schema, compression="zstd", use_dictionary=True) as writer:
+            batch = []
+            for row in _entry_rows(xml_path):
+                batch.append(row)
+                if len(batch) >= _PARQUET_BATCH_SIZE:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    batch.clear()
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    except BaseException:
+        # Do not leave a half-written Parquet file next to the report
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+        raise
+    return parquet_path
+
+# Input validation, so malformed IDs are rejected before a failed auth or API round-trip.
+# Tenants may be given as a GUID or as a domain such as contoso.onmicrosoft.com.
+_GUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+_TENANT_DOMAIN = re.compile(r"^[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)+$")
+
+# OData $filter templates for each report type; values are escaped with _odata_literal before substitution
+_MESSAGE_TRACE_URL = "https://reports.office365.com/ecp/reportingwebservice/reporting.svc/MessageTrace"
+_MESSAGE_TRACE_DETAIL_URL = "https://reports.office365.com/ecp/reportingwebservice/reporting.svc/MessageTraceDetail"
+_BASIC_FILTER = "$filter=StartDate eq datetime'{sd}T00:00:00Z' and EndDate eq datetime'{ed}T23:59:59Z'"
+_DETAIL_FILTER = (
+    "$filter=MessageTraceId eq guid'{mid}' and "
+    "RecipientAddress eq '{rcpt}' and "
+    "SenderAddress eq '{sndr}' and "
+    "StartDate eq datetime'{sd}T00:00:00Z' and "
+    "EndDate eq datetime'{ed}T23:59:59Z'"
+)
+
+def _odata_literal(value):
+    # Doubles single quotes as OData string literals require, then percent-encodes for the query string
+    return quote(value.replace("'", "''"), safe="")
+
+def main():
+    def get_message_trace_report():
+        # Gather user inputs on the Tk thread; widgets must not be touched from the worker thread
+        app_id = app_id_entry.get().strip()
+        tenant_id = tenant_id_entry.get().strip()
+        app_secret = app_secret_entry.get().strip()
+        start_date = start_date_entry.get_date().strftime('%Y-%m-%d')
+        end_date = end_date_entry.get_date().strftime('%Y-%m-%d')
+        save_path = save_path_var.get()
+
+        # Report type selection
+        report_type = report_type_combobox.get()
+        save_parquet = save_parquet_var.get()
+
+        if not all((app_id, tenant_id, app_secret)):
+            messagebox.showerror("Error", "App ID, Tenant ID, and App Secret are required!")
+            return
+
+        if not _GUID.match(app_id):
+            messagebox.showerror("Error", "App ID must be a GUID (xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx)!")
+            return
+
+        if not _GUID.match(tenant_id) and not _TENANT_DOMAIN.match(tenant_id):
+            messagebox.showerror("Error", "Tenant ID must be a GUID or a tenant domain name!")
+            return
+
+        if not start_date or not end_date:
+            messagebox.showerror("Error", "Start Date and End Date are required!")
+            return
+
+        if not save_path:
+            messagebox.showerror("Error", "Please select a folder to save the report!")
+            return
+
+        if save_parquet and importlib.util.find_spec("pyarrow") is None:
+            messagebox.showerror("Error", "Saving as Parquet requires the pyarrow package!")
+            return
+
+        # Validate if Message Trace Detail is selected and required fields are filled
+        if report_type == "Message Trace Detail":
+            sender_address = sender_address_entry.get().strip()
+            recipient_address = recipient_address_entry.get().strip()
+            message_trace_id = message_trace_id_entry.get().strip()
+
+            if not all((sender_address, recipient_address, message_trace_id)):
+                messagebox.showerror("Error", "Sender Address, Recipient Address, and Message Trace ID are mandatory for Message Trace Detail!")
                 return
 
-            # API URL and query parameters setup based on report type
-            headers = {"Authorization": f"Bearer {token}"}
-            base_url = "https://reports.office365.com/ecp/reportingwebservice/reporting.svc/MessageTrace"
-
-            if report_type == "Message Trace Detail":
-                base_url = "https://reports.office365.com/ecp/reportingwebservice/reporting.svc/MessageTraceDetail"
-                query_params = (
-                    f"$filter=MessageTraceId eq guid'{message_trace_id}' and "
-                    f"RecipientAddress eq '{recipient_address}' and "
-                    f"SenderAddress eq '{sender_address}' and "
-                    f"StartDate eq datetime'{start_date}T00:00:00Z' and "
-                    f"EndDate eq datetime'{end_date}T23:59:59Z'"
-                )
-            else:  # Default to Message Trace
-                query_params = (
-                    f"$filter=StartDate eq datetime'{start_date}T00:00:00Z' and "
-                    f"EndDate eq datetime'{end_date}T23:59:59Z'"
-                )
-
-            url = f"{base_url}?{query_params}"
-            response = requests.get(url, headers=headers)
-
-            # Handle API response
-            if response.status_code != 200:
-                messagebox.showerror("Error", f"API call failed: {response.text}")
+            if not _GUID.match(message_trace_id):
+                messagebox.showerror("Error", "Message Trace ID must be a GUID (xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx)!")
                 return
 
-            # Save the report
-            output_path = os.path.join(save_path, f"MessageTraceReport_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xml")
-            with open(output_path, "wb") as file:
-                file.write(response.content)
-
-            # Update the processing label and show success
-            processing_label.config(text="Processing complete!")
-            messagebox.showinfo("Success", f"Report saved to {output_path}")
-
-            # Open the folder containing the saved report
-            subprocess.run(f'explorer /select,"{os.path.abspath(output_path)}"')
+        # Update the processing label
+        processing_label.config(text="Processing... Please wait.")
 
-        except requests.exceptions.RequestException as req_err:
-            messagebox.showerror("Error", f"Request error: {req_err}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error occurred: {e}")
-        finally:
+        def finish(show, title, message):
+            # Runs on the Tk thread (scheduled with root.after) once the worker is done
+            show(title, message)
             # Reset progress label after processing
             processing_label.config(text="")
 
-    # Start background task in a separate thread to avoid blocking the UI
-    threading.Thread(target=background_task, daemon=True).start()
+        def background_task():
+            # Loaded here rather than at module level to keep them off the startup path. Creating the session
+            # up front means a missing requests is reported now, not from inside the error handling below.
+            try:
+                _http_session()
+                import subprocess
+            except ImportError as e:
+                root.after(0, finish, messagebox.showerror, "Error", f"A required package could not be loaded: {e}")
+                return
 
+            try:
+                # Create the save folder if needed; exist_ok avoids the exists/makedirs race between clicks
+                os.makedirs(save_path, exist_ok=True)
 
-def browse_folder():
-    folder = filedialog.askdirectory()
-    if folder:
-        save_path_var.set(folder)
+                # Token acquisition (cached across reports until shortly before expiry)
+                token = _get_token(tenant_id, app_id, app_secret)
 
-# Get the current date and calculate the max date for both Start Date and End Date
-current_date = datetime.now()
-max_past_date_for_start = current_date - timedelta(days=10)  # 10 days ago for start date
-max_past_date_for_end = current_date + timedelta(days=10)  # 10 days in the future for end date
+                if not token:
+                    root.after(0, finish, messagebox.showerror, "Error", "Failed to retrieve OAuth token!")
+                    return
 
-# GUI setup
-root = tk.Tk()
-root.title("Office 365 Reporting Web Services - MessageTrace")
+                # API URL and query parameters setup based on report type
+                # The OData XML compresses well, so ask for gzip/deflate explicitly; it is decoded while streaming to disk
+                headers = {
+                    "Authorization": f"Bearer {token}",
+                    "Accept-Encoding": "gzip, deflate",
+                    "Accept": "application/atom+xml",
+                }
+                if report_type == "Message Trace Detail":
+                    base_url = _MESSAGE_TRACE_DETAIL_URL
+                    query_params = _DETAIL_FILTER.format(
+                        mid=_odata_literal(message_trace_id),
+                        rcpt=_odata_literal(recipient_address),
+                        sndr=_odata_literal(sender_address),
+                        sd=start_date,
+                        ed=end_date,
+                    )
+                else:  # Default to Message Trace
+                    base_url = _MESSAGE_TRACE_URL
+                    query_params = _BASIC_FILTER.format(sd=start_date, ed=end_date)
+
+                url = f"{base_url}?{query_params}"
+                output_path = os.path.join(save_path, "MessageTraceReport_" + time.strftime('%Y%m%d_%H%M%S') + ".xml")
+                error = _download_page(url, headers, output_path)
+
+                # Handle API response
+                if error is not None:
+                    root.after(0, finish, messagebox.showerror, "Error", f"API call failed: {error}")
+                    return
 
-# Set the window icon (favicon)
-if getattr(sys, 'frozen', False):
-    icon_path = os.path.join(sys._MEIPASS, 'Logo_RWS.ico')
-else:
-    icon_path = os.path.abspath("Logo_RWS.ico")
+                # Pull in any further pages so multi-day traces are not silently truncated
+                try:
+                    _merge_next_pages(output_path, headers)
+                except Exception as e:
+                    root.after(0, finish, messagebox.showerror, "Error", f"Retrieving the report pages failed, so no report was saved. {_error_message(e)}")
+                    return
 
-try:
-    root.iconbitmap(icon_path)
-except Exception as e:
-    print(f"Error loading icon: {e}")
-
-main_frame = ttk.Frame(root, padding="10")
-main_frame.grid(row=0, column=0, sticky="NSEW")
-
-# App ID
-ttk.Label(main_frame, text="App ID:").grid(row=0, column=0, sticky="W")
-app_id_entry = ttk.Entry(main_frame, width=50)
-app_id_entry.grid(row=0, column=1, padx=5, pady=5)
-
-# Tenant ID
-ttk.Label(main_frame, text="Tenant ID:").grid(row=1, column=0, sticky="W")
-tenant_id_entry = ttk.Entry(main_frame, width=50)
-tenant_id_entry.grid(row=1, column=1, padx=5, pady=5)
-
-# App Secret
-ttk.Label(main_frame, text="App Secret:").grid(row=2, column=0, sticky="W")
-app_secret_entry = ttk.Entry(main_frame, show="*", width=50)
-app_secret_entry.grid(row=2, column=1, padx=5, pady=5)
-
-# Start Date (using DateEntry with a max date of 10 days ago from the current date)
-ttk.Label(main_frame, text="Start Date:").grid(row=3, column=0, sticky="W")
-start_date_entry = DateEntry(main_frame, width=50, date_pattern="yyyy-mm-dd", mindate=max_past_date_for_start, maxdate=current_date)
-start_date_entry.grid(row=3, column=1, padx=5, pady=5)
-
-# End Date (using DateEntry with a max date of 10 days ago from the current date and any day in the future)
-ttk.Label(main_frame, text="End Date:").grid(row=4, column=0, sticky="W")
-end_date_entry = DateEntry(main_frame, width=50, date_pattern="yyyy-mm-dd", maxdate=max_past_date_for_end)
-end_date_entry.grid(row=4, column=1, padx=5, pady=5)
-
-# Report Type (Dropdown)
-ttk.Label(main_frame, text="Report Type:").grid(row=5, column=0, sticky="W", padx=5, pady=5)
-report_type_combobox = ttk.Combobox(main_frame, values=["Message Trace", "Message Trace Detail"], state="readonly", width=48)
-report_type_combobox.grid(row=5, column=1, padx=5, pady=5)
-
-# Sender Address (visible only for Message Trace Detail)
-ttk.Label(main_frame, text="Sender Address: *").grid(row=6, column=0, sticky="W", padx=5, pady=5)
-sender_address_entry = ttk.Entry(main_frame, width=50)
-sender_address_entry.grid(row=6, column=1, padx=5, pady=5)
-sender_address_entry.grid_forget()  # Initially hidden
-
-# Recipient Address (visible only for Message Trace Detail)
-ttk.Label(main_frame, text="Recipient Address: *").grid(row=7, column=0, sticky="W", padx=5, pady=5)
-recipient_address_entry = ttk.Entry(main_frame, width=50)
-recipient_address_entry.grid(row=7, column=1, padx=5, pady=5)
-recipient_address_entry.grid_forget()  # Initially hidden
-
-# Message Trace ID (visible only for Message Trace Detail)
-ttk.Label(main_frame, text="Message Trace ID: *").grid(row=8, column=0, sticky="W", padx=5, pady=5)
-message_trace_id_entry = ttk.Entry(main_frame, width=50)
-message_trace_id_entry.grid(row=8, column=1, padx=5, pady=5)
-message_trace_id_entry.grid_forget()  # Initially hidden
-
-# Default Save Path (hardcoded)
-save_path_var = tk.StringVar(value=r"C:\temp\ReportingWebServices-logs")
-
-# Save Path
-ttk.Label(main_frame, text="Save Path:").grid(row=9, column=0, sticky="W", padx=5, pady=5)
-save_path_entry = ttk.Entry(main_frame, textvariable=save_path_var, width=50)
-save_path_entry.grid(row=9, column=1, padx=5, pady=5)
-ttk.Button(main_frame, text="Browse", command=browse_folder).grid(row=9, column=2, padx=5, pady=5)
-
-# Processing Label (initially empty)
-processing_label = ttk.Label(main_frame, text="", foreground="red")
-processing_label.grid(row=10, column=0, columnspan=3, pady=10, sticky="W")
-
-# Generate Report Button
-ttk.Button(main_frame, text="Generate Report", command=get_message_trace_report).grid(row=11, column=0, columnspan=3, pady=10)
-
-# Show/Hide fields based on report type selection
-def on_report_type_select(event):
-    if report_type_combobox.get() == "Message Trace Detail":
-        sender_address_entry.grid(row=6, column=1, padx=5, pady=5)
-        recipient_address_entry.grid(row=7, column=1, padx=5, pady=5)
-        message_trace_id_entry.grid(row=8, column=1, padx=5, pady=5)
+                success_message = f"Report saved to {output_path}"
+                if save_parquet:
+                    try:
+                        parquet_path = _convert_to_parquet(output_path)
+                    except Exception as e:
+                        root.after(0, finish, messagebox.showerror, "Error", f"Report saved to {output_path}, but converting it to Parquet failed: {e}")
+                        return
+                    if parquet_path:
+                        success_message += f"\nParquet copy saved to {parquet_path}"
+
+                # Update the processing label and show success
+                root.after(0, lambda: processing_label.config(text="Processing complete!"))
+                root.after(0, finish, messagebox.showinfo, "Success", success_message)
+
+                # Open the folder containing the saved report (fire-and-forget, no shell parsing)
+                if sys.platform == "win32":
+                    subprocess.Popen(
+                        ["explorer.exe", f"/select,{os.path.abspath(output_path)}"],
+                        close_fds=True,
+                        creationflags=subprocess.DETACHED_PROCESS,
+                    )
+
+            except Exception as e:
+                root.after(0, finish, messagebox.showerror, "Error", _error_message(e))
+
+        # Start background task in a separate thread to avoid blocking the UI
+        threading.Thread(target=background_task, daemon=True).start()
+
+    def browse_folder():
+        folder = filedialog.askdirectory()
+        if folder:
+            save_path_var.set(folder)
+
+    # Get the current date and calculate the max date for both Start Date and End Date
+    current_date = datetime.now()
+    max_past_date_for_start = current_date - timedelta(days=10)  # 10 days ago for start date
+    max_past_date_for_end = current_date + timedelta(days=10)  # 10 days in the future for end date
+
+    # GUI setup
+    root = tk.Tk()
+    root.title("Office 365 Reporting Web Services - MessageTrace")
+
+    # Set the window icon (favicon)
+    if getattr(sys, 'frozen', False):
+        icon_path = os.path.join(sys._MEIPASS, 'Logo_RWS.ico')
     else:
-        sender_address_entry.grid_forget()
-        recipient_address_entry.grid_forget()
-        message_trace_id_entry.grid_forget()
-
-# Bind the event for report type selection
-report_type_combobox.bind("<<ComboboxSelected>>", on_report_type_select)
-
-root.mainloop()
+        icon_path = os.path.abspath("Logo_RWS.ico")
+
+    try:
+        root.iconbitmap(icon_path)
+    except Exception as e:
+        print(f"Error loading icon: {e}")
+
+    main_frame = ttk.Frame(root, padding="10")
+    main_frame.grid(row=0, column=0, sticky="NSEW")
+
+    # App ID
+    ttk.Label(main_frame, text="App ID:").grid(row=0, column=0, sticky="W")
+    app_id_entry = ttk.Entry(main_frame, width=50)
+    app_id_entry.grid(row=0, column=1, padx=5, pady=5)
+
+    # Tenant ID
+    ttk.Label(main_frame, text="Tenant ID:").grid(row=1, column=0, sticky="W")
+    tenant_id_entry = ttk.Entry(main_frame, width=50)
+    tenant_id_entry.grid(row=1, column=1, padx=5, pady=5)
+
+    # App Secret
+    ttk.Label(main_frame, text="App Secret:").grid(row=2, column=0, sticky="W")
+    app_secret_entry = ttk.Entry(main_frame, show="*", width=50)
+    app_secret_entry.grid(row=2, column=1, padx=5, pady=5)
+
+    # Start Date (using DateEntry with a max date of 10 days ago from the current date)
+    ttk.Label(main_frame, text="Start Date:").grid(row=3, column=0, sticky="W")
+    start_date_entry = DateEntry(main_frame, width=50, date_pattern="yyyy-mm-dd", mindate=max_past_date_for_start, maxdate=current_date)
+    start_date_entry.grid(row=3, column=1, padx=5, pady=5)
+
+    # End Date (using DateEntry with a max date of 10 days ago from the current date and any day in the future)
+    ttk.Label(main_frame, text="End Date:").grid(row=4, column=0, sticky="W")
+    end_date_entry = DateEntry(main_frame, width=50, date_pattern="yyyy-mm-dd", maxdate=max_past_date_for_end)
+    end_date_entry.grid(row=4, column=1, padx=5, pady=5)
+
+    # Report Type (Dropdown)
+    ttk.Label(main_frame, text="Report Type:").grid(row=5, column=0, sticky="W", padx=5, pady=5)
+    report_type_combobox = ttk.Combobox(main_frame, values=["Message Trace", "Message Trace Detail"], state="readonly", width=48)
+    report_type_combobox.grid(row=5, column=1, padx=5, pady=5)
+
+    # Sender Address (visible only for Message Trace Detail)
+    ttk.Label(main_frame, text="Sender Address: *").grid(row=6, column=0, sticky="W", padx=5, pady=5)
+    sender_address_entry = ttk.Entry(main_frame, width=50)
+    sender_address_entry.grid(row=6, column=1, padx=5, pady=5)
+    sender_address_entry.grid_remove()  # Initially hidden
+
+    # Recipient Address (visible only for Message Trace Detail)
+    ttk.Label(main_frame, text="Recipient Address: *").grid(row=7, column=0, sticky="W", padx=5, pady=5)
+    recipient_address_entry = ttk.Entry(main_frame, width=50)
+    recipient_address_entry.grid(row=7, column=1, padx=5, pady=5)
+    recipient_address_entry.grid_remove()  # Initially hidden
+
+    # Message Trace ID (visible only for Message Trace Detail)
+    ttk.Label(main_frame, text="Message Trace ID: *").grid(row=8, column=0, sticky="W", padx=5, pady=5)
+    message_trace_id_entry = ttk.Entry(main_frame, width=50)
+    message_trace_id_entry.grid(row=8, column=1, padx=5, pady=5)
+    message_trace_id_entry.grid_remove()  # Initially hidden
+
+    # Default Save Path (hardcoded)
+    save_path_var = tk.StringVar(value=r"C:\temp\ReportingWebServices-logs")
+
+    # Save Path
+    ttk.Label(main_frame, text="Save Path:").grid(row=9, column=0, sticky="W", padx=5, pady=5)
+    save_path_entry = ttk.Entry(main_frame, textvariable=save_path_var, width=50)
+    save_path_entry.grid(row=9, column=1, padx=5, pady=5)
+    ttk.Button(main_frame, text="Browse", command=browse_folder).grid(row=9, column=2, padx=5, pady=5)
+
+    # Also save as Parquet (compact columnar copy for downstream analysis)
+    save_parquet_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(main_frame, text="Also save as Parquet", variable=save_parquet_var).grid(row=10, column=1, sticky="W", padx=5, pady=5)
+
+    # Processing Label (initially empty)
+    processing_label = ttk.Label(main_frame, text="", foreground="red")
+    processing_label.grid(row=11, column=0, columnspan=3, pady=10, sticky="W")
+
+    # Generate Report Button
+    ttk.Button(main_frame, text="Generate Report", command=get_message_trace_report).grid(row=12, column=0, columnspan=3, pady=10)
+
+    # Show/Hide fields based on report type selection
+    def on_report_type_select(event):
+        # grid_remove keeps each entry's grid options, so a bare grid() restores it in place
+        if report_type_combobox.get() == "Message Trace Detail":
+            sender_address_entry.grid()
+            recipient_address_entry.grid()
+            message_trace_id_entry.grid()
+        else:
+            sender_address_entry.grid_remove()
+            recipient_address_entry.grid_remove()
+            message_trace_id_entry.grid_remove()
+
+    # Bind the event for report type selection
+    report_type_combobox.bind("<<ComboboxSelected>>", on_report_type_select)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()